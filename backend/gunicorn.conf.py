@@ -0,0 +1,18 @@
+# Production server config: gunicorn -c gunicorn.conf.py main:app
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+
+# UvicornWorker picks uvloop and httptools automatically when they are installed; the subclass
+# turns worker_connections into a real per-worker concurrency cap
+worker_class = "workers.BoundedUvicornWorker"
+worker_connections = 1000
+
+# Sessions only survive across workers when they live in Redis, so fall back to one worker without it
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2)) if os.getenv("REDIS_URL") else 1
+# Tell the app how many workers share the CPUs (used to size its text-splitting pool)
+raw_env = [f"WEB_CONCURRENCY={workers}"]
+
+# Each worker builds its own HTTP pool and clients at import time, so the app must not be preloaded
+preload_app = False
@@ -1,27 +1,43 @@
 import os
 import shutil
 import uuid
-import subprocess
-from fastapi import FastAPI, UploadFile, File, HTTPException, Body
+import asyncio
+import hashlib
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from fastapi import FastAPI, UploadFile, File, HTTPException, Body, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
 from dotenv import load_dotenv
 
 load_dotenv()  # Load environment variables from .env
 
-from langchain.chat_models import AzureChatOpenAI
-from langchain_openai import AzureOpenAIEmbeddings
+import aiofiles
+import aiofiles.tempfile
+from cachetools import TTLCache
+import diskcache
+import faiss
+import httpx
+import numpy as np
+import orjson
+import redis.asyncio as redis
+from redis.exceptions import WatchError
+import tiktoken
+from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
 from langchain.vectorstores import FAISS
 from langchain.chains.summarize import load_summarize_chain
 from langchain.document_loaders import PyPDFLoader  # For PDFs; for DOCX, see below
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.docstore.document import Document as LangchainDocument
-from langchain_community.utilities import SerpAPIWrapper
 from langchain.schema import AIMessage, HumanMessage, SystemMessage
+from langchain_community.utilities import SerpAPIWrapper
 
-app = FastAPI(title="AI Research Assistant Backend", version="1.0.0")
+app = FastAPI(title="AI Research Assistant Backend", version="1.0.0", default_response_class=ORJSONResponse)
 
 # Enable CORS
 app.add_middleware(
@@ -31,32 +47,443 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("shutdown")
+async def close_http_client():
+    await HTTPX_CLIENT.aclose()
+
 # Load API keys and parameters
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 AZURE_DEPLOYMENT = os.getenv("AZURE_DEPLOYMENT")
 AZURE_API_VERSION = os.getenv("AZURE_API_VERSION")
 AZURE_ENDPOINT = os.getenv("AZURE_ENDPOINT")
 SERPAPI_API_KEY = os.getenv("SERP_API_KEY")
+REDIS_URL = os.getenv("REDIS_URL")
+UPLOAD_CACHE_DIR = os.getenv("UPLOAD_CACHE_DIR", "./.cache/uploads")
+# Directory for upload temp files; point at a tmpfs such as /dev/shm to avoid disk I/O (None = system default)
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR")
 
 
 if not (OPENAI_API_KEY and AZURE_DEPLOYMENT and AZURE_API_VERSION and AZURE_ENDPOINT):
     raise RuntimeError("Azure OpenAI configuration is incomplete. Please set the required environment variables.")
 
+# Embedding requests are batched by item count and total tokens, with a cap on in-flight calls
+EMBED_BATCH_MAX_ITEMS = 96
+EMBED_BATCH_MAX_TOKENS = 8192
+EMBED_MAX_CONCURRENCY = 8
+embed_semaphore = asyncio.Semaphore(EMBED_MAX_CONCURRENCY)
+
+# Shared HTTP/2 connection pool for all Azure OpenAI and SerpAPI calls
+HTTPX_CLIENT = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=64, max_connections=256),
+    timeout=30,
+)
+
+EMBED_DEPLOYMENT = "text-embedding-ada-002"
+
 embedding_model = AzureOpenAIEmbeddings(
-    azure_deployment="text-embedding-ada-002",
+    azure_deployment=EMBED_DEPLOYMENT,
     openai_api_key=OPENAI_API_KEY,
     azure_endpoint=AZURE_ENDPOINT,
-    chunk_size=1024
+    chunk_size=EMBED_BATCH_MAX_ITEMS,
+    http_async_client=HTTPX_CLIENT,
 )
 
-# In-memory session storage
-class SessionData(BaseModel):
-    history: List[dict] = []
+# Shared LLM clients, built once and reused across requests
+SUMMARIZE_LLM = AzureChatOpenAI(
+    azure_deployment=AZURE_DEPLOYMENT,
+    openai_api_key=OPENAI_API_KEY,
+    openai_api_type="azure",
+    openai_api_version=AZURE_API_VERSION,
+    azure_endpoint=AZURE_ENDPOINT,
+    temperature=0.0,
+    max_tokens=500,
+    verbose=False,
+    http_async_client=HTTPX_CLIENT,
+)
+summarize_chain = load_summarize_chain(SUMMARIZE_LLM, chain_type="map_reduce")
+
+# The chain's own map step gathers one chat call per chunk with no limit, so it is run here
+# through a semaphore instead (shared by all uploads in this worker) to stay under Azure rate limits
+SUMMARIZE_MAX_CONCURRENCY = 8
+summarize_semaphore = asyncio.Semaphore(SUMMARIZE_MAX_CONCURRENCY)
+
+async def summarize_documents(docs: List[LangchainDocument]) -> str:
+    """Map-reduce summary of docs with at most SUMMARIZE_MAX_CONCURRENCY map calls in flight."""
+    async def summarize_one(doc: LangchainDocument) -> str:
+        async with summarize_semaphore:
+            return await summarize_chain.llm_chain.arun(**{summarize_chain.document_variable_name: doc.page_content})
+
+    summaries = await asyncio.gather(*[summarize_one(doc) for doc in docs])
+    # The reduce step collapses and combines the partial summaries one call at a time
+    summary_text, _ = await summarize_chain.reduce_documents_chain.acombine_docs(
+        [LangchainDocument(page_content=summary) for summary in summaries]
+    )
+    return summary_text
+
+# Temperature is overridden per request via .bind(), see /chat
+CHAT_LLM = AzureChatOpenAI(
+    azure_deployment=AZURE_DEPLOYMENT,
+    openai_api_key=OPENAI_API_KEY,
+    openai_api_type="azure",
+    openai_api_version=AZURE_API_VERSION,
+    azure_endpoint=AZURE_ENDPOINT,
+    verbose=False,
+    http_async_client=HTTPX_CLIENT,
+)
+
+SPLITTER = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100, length_function=len)
+
+# Splitting is CPU-bound: small documents go to a thread, large ones are cut into paragraph-aligned
+# slices and split in a process pool. The CPUs are shared between all server workers
+# (WEB_CONCURRENCY), and pool processes are started fresh rather than forked from this one, which
+# already holds threads, sockets and the loaded models. With the shipped gunicorn config
+# (2 x CPU workers) SPLIT_WORKERS is always 1, so there every document takes the thread path and
+# the pool is only used by deployments running fewer workers than CPUs
+PARALLEL_SPLIT_MIN_CHARS = 200_000
+SPLIT_WORKERS = max(1, (os.cpu_count() or 1) // int(os.getenv("WEB_CONCURRENCY", "1")))
+SPLIT_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+split_pool: Optional[ProcessPoolExecutor] = None
+
+@app.on_event("shutdown")
+def close_split_pool():
+    if split_pool is not None:
+        split_pool.shutdown(wait=False, cancel_futures=True)
+
+async def split_document(text: str) -> List[str]:
+    """Split text into chunks without blocking the event loop."""
+    global split_pool
+    if len(text) < PARALLEL_SPLIT_MIN_CHARS or SPLIT_WORKERS == 1:
+        return await asyncio.to_thread(SPLITTER.split_text, text)
+
+    target_size = len(text) // SPLIT_WORKERS + 1
+    slices, current, current_size = [], [], 0
+    for paragraph in text.split("\n\n"):
+        current.append(paragraph)
+        current_size += len(paragraph) + 2
+        if current_size >= target_size:
+            slices.append("\n\n".join(current))
+            current, current_size = [], 0
+    if current:
+        slices.append("\n\n".join(current))
+    # Text without blank lines (typical PyMuPDF output) yields one slice; shipping it to a
+    # subprocess would only add pickling cost
+    if len(slices) == 1:
+        return await asyncio.to_thread(SPLITTER.split_text, text)
+
+    # Slices are split independently, so the chunk_overlap is lost at the few slice boundaries;
+    # those fall on paragraph breaks, where the splitter would prefer to cut anyway
+    if split_pool is None:
+        split_pool = ProcessPoolExecutor(max_workers=SPLIT_WORKERS, mp_context=SPLIT_MP_CONTEXT)
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(*[loop.run_in_executor(split_pool, SPLITTER.split_text, part) for part in slices])
+    return [chunk for part_chunks in results for chunk in part_chunks]
+
+# Web research goes straight to the SerpAPI endpoint so it can use the shared pool
+SERPAPI_URL = "https://serpapi.com/search"
+SERPAPI_PARAMS = {"engine": "bing", "gl": "us", "hl": "en"}
+
+async def web_search(query: str) -> str:
+    response = await HTTPX_CLIENT.get(SERPAPI_URL, params={**SERPAPI_PARAMS, "q": query, "api_key": SERPAPI_API_KEY})
+    response.raise_for_status()
+    # Reuse SerpAPIWrapper's answer selection so results match what the wrapper would return. This is
+    # a private staticmethod, so langchain-community is pinned in requirements.txt; recheck it on upgrade
+    result = SerpAPIWrapper._process_response(response.json())
+    # News, top-stories, sports and highlighted-word results come back as lists/dicts, not text
+    if isinstance(result, str):
+        return result
+    return json.dumps(result, ensure_ascii=False, default=str)
+
+# Size of each read when spooling an upload to disk
+UPLOAD_READ_CHUNK_SIZE = 1024 * 1024
+
+# Content-addressed cache of processed uploads ("upload:<chat deployment>:<embedding deployment>:<hash>")
+# and chunk embeddings ("emb:<embedding deployment>:<hash>"); keying on the deployments keeps results
+# from a previous model from being mixed in after a switch
+document_cache = diskcache.Cache(UPLOAD_CACHE_DIR)
+
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+SYSTEM_PROMPT = "You are an AI assistant."
+
+# Chat message classes by history role; unknown roles are sent as user messages
+MESSAGE_TYPES = {"system": SystemMessage, "user": HumanMessage, "assistant": AIMessage}
+
+# Number of document chunks retrieved into the prompt per question
+RETRIEVAL_TOP_K = 4
+
+# Session state; stored in Redis when REDIS_URL is set so that all workers share it
+SESSION_TTL_SECONDS = 3600
+MAX_LOCAL_SESSIONS = 10_000
+MAX_DECODED_DOCUMENTS = 256
+
+@dataclass(slots=True)
+class SessionData:
+    history: List[dict] = field(default_factory=list)
     doc_summary: Optional[str] = None
-    doc_vectors: Optional[List[List[float]]] = None
+    doc_index: Optional[faiss.Index] = None
     doc_chunks: Optional[List[str]] = None
+    # Changes on every upload; identifies the document in the per-worker decoded-document cache
+    doc_version: Optional[str] = None
+
+@lru_cache(maxsize=1)
+def get_embed_tokenizer() -> tiktoken.Encoding:
+    # Loaded on first use: get_encoding downloads the BPE file, which must not happen at import
+    return tiktoken.get_encoding("cl100k_base")
+
+def batch_chunks(chunks: List[str]) -> List[List[str]]:
+    """Group chunks into embedding requests of at most EMBED_BATCH_MAX_ITEMS items / EMBED_BATCH_MAX_TOKENS tokens."""
+    if not chunks:
+        return []
+    batches, batch, batch_tokens = [], [], 0
+    # encode_ordinary treats special-token text such as <|endoftext|> as plain text instead of raising
+    token_counts = [len(tokens) for tokens in get_embed_tokenizer().encode_ordinary_batch(chunks)]
+    for chunk, tokens in zip(chunks, token_counts):
+        if batch and (len(batch) >= EMBED_BATCH_MAX_ITEMS or batch_tokens + tokens > EMBED_BATCH_MAX_TOKENS):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(chunk)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+async def embed_chunks(chunks: List[str]) -> np.ndarray:
+    """Embed chunks as concurrent batched requests, returning a float32 (N, d) array in input order.
+
+    Vectors are cached per chunk text, so only chunks not seen before are sent to Azure.
+    """
+    keys = [f"emb:{EMBED_DEPLOYMENT}:{content_hash(chunk.encode('utf-8'))}" for chunk in chunks]
+    cached = await asyncio.to_thread(lambda: [document_cache.get(key) for key in keys])
+    missing = [i for i, v in enumerate(cached) if v is None]
+
+    async def embed_batch(batch: List[str]) -> List[List[float]]:
+        async with embed_semaphore:
+            return await embedding_model.aembed_documents(batch)
+
+    batches = await asyncio.to_thread(batch_chunks, [chunks[i] for i in missing])
+    results = await asyncio.gather(*[embed_batch(batch) for batch in batches])
+    new_vectors = np.asarray([vector for batch_vectors in results for vector in batch_vectors], dtype=np.float32)
+
+    dim = new_vectors.shape[1] if missing else len(cached[0]) // np.dtype(np.float32).itemsize
+    vectors = np.empty((len(chunks), dim), dtype=np.float32)
+    for i, v in enumerate(cached):
+        if v is not None:
+            vectors[i] = np.frombuffer(v, dtype=np.float32)
+    if missing:
+        vectors[missing] = new_vectors
+
+    def store():
+        for i in missing:
+            document_cache.set(keys[i], vectors[i].tobytes())
+    await asyncio.to_thread(store)
+    return vectors
+
+def build_index(vectors: np.ndarray) -> faiss.Index:
+    """Build a cosine-similarity index (inner product over L2-normalized rows).
+
+    `vectors` must be a contiguous float32 (N, d) array; it is normalized in place. The index
+    stores 8-bit scalar-quantized codes, so the float32 array can be dropped once this returns.
+    """
+    faiss.normalize_L2(vectors)
+    # SQ8 only learns per-dimension ranges, so the document's own vectors are enough to train it
+    index = faiss.IndexScalarQuantizer(vectors.shape[1], faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    index.train(vectors)
+    index.add(vectors)
+    return index
+
+def build_system_prompt_prefix(session: SessionData) -> str:
+    """Render the part of the system prompt that stays the same for every turn of a session.
+
+    With an index, document context is retrieved per question instead; without one the summary is used.
+    Cheap enough to render per turn, so it is not stored on the session.
+    """
+    if session.doc_index is None and session.doc_summary:
+        return f"{SYSTEM_PROMPT}\nRelevant document information:\n{session.doc_summary}"
+    return SYSTEM_PROMPT
+
+def serialize_index(index: faiss.Index) -> bytes:
+    return faiss.serialize_index(index).tobytes()
+
+def deserialize_index(data: bytes) -> faiss.Index:
+    return faiss.deserialize_index(np.frombuffer(data, dtype=np.uint8))
+
+async def retrieve_chunks(session: SessionData, question: str, k: int = RETRIEVAL_TOP_K) -> List[str]:
+    """Return the document chunks most similar to the question."""
+    qv = np.asarray(await embedding_model.aembed_query(question), dtype=np.float32)[None, :]
+    faiss.normalize_L2(qv)
+    _, ids = session.doc_index.search(qv, min(k, session.doc_index.ntotal))
+    return [session.doc_chunks[i] for i in ids[0] if i != -1]
+
+redis_client = redis.from_url(REDIS_URL) if REDIS_URL else None
+
+# In-process fallback used when Redis is not configured (single worker only); bounded and
+# expiring like the Redis store, with the TTL refreshed on every write
+sessions = TTLCache(maxsize=MAX_LOCAL_SESSIONS, ttl=SESSION_TTL_SECONDS)
+
+@app.on_event("shutdown")
+async def close_redis_client():
+    if redis_client is not None:
+        await redis_client.aclose()
+
+# Redis layout per session:
+#   session:<id>:doc      hash with the document (version, summary, chunks as JSON, serialized index);
+#                         written only on upload
+#   session:<id>:history  list of JSON history entries; each chat turn appends to it
+# Both keys expire SESSION_TTL_SECONDS after the session's last write.
+def doc_key(session_id: str) -> str:
+    return f"session:{session_id}:doc"
 
-sessions = {}
+def history_key(session_id: str) -> str:
+    return f"session:{session_id}:history"
+
+# Decoded (chunks, index) per (session id, document version), so chat turns in this worker do not
+# re-fetch and re-decode the document from Redis
+decoded_documents = TTLCache(maxsize=MAX_DECODED_DOCUMENTS, ttl=SESSION_TTL_SECONDS)
+
+def decode_document(chunks_json: Optional[bytes], index_bytes: Optional[bytes]) -> tuple:
+    chunks = json.loads(chunks_json) if chunks_json else None
+    index = deserialize_index(index_bytes) if index_bytes else None
+    return chunks, index
+
+def encode_document(session: SessionData) -> dict:
+    mapping = {"version": session.doc_version, "summary": session.doc_summary or ""}
+    if session.doc_chunks is not None:
+        mapping["chunks"] = json.dumps(session.doc_chunks)
+    if session.doc_index is not None:
+        mapping["index"] = serialize_index(session.doc_index)
+    return mapping
+
+async def load_session(session_id: Optional[str]) -> Optional[SessionData]:
+    """Fetch a session by id, or None if it does not exist (or has expired)."""
+    if not session_id or session_id == "undefined":
+        return None
+    if redis_client is None:
+        return sessions.get(session_id)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.hmget(doc_key(session_id), "version", "summary")
+        pipe.lrange(history_key(session_id), 0, -1)
+        (version, summary), history = await pipe.execute()
+    if version is None and not history:
+        return None
+
+    session = SessionData(history=[json.loads(entry) for entry in history])
+    if version is not None:
+        decoded = decoded_documents.get((session_id, version.decode()))
+        if decoded is None:
+            # Re-read the version with the payload so the cache entry matches what was fetched
+            version, summary, chunks_json, index_bytes = await redis_client.hmget(
+                doc_key(session_id), "version", "summary", "chunks", "index"
+            )
+            if version is None:
+                return session
+            decoded = await asyncio.to_thread(decode_document, chunks_json, index_bytes)
+            decoded_documents[(session_id, version.decode())] = decoded
+        session.doc_version = version.decode()
+        session.doc_summary = summary.decode() if summary else None
+        session.doc_chunks, session.doc_index = decoded
+    return session
+
+async def save_document(session_id: str, session: SessionData) -> None:
+    """Persist the session's document after an upload; chat turns never rewrite it."""
+    session.doc_version = uuid.uuid4().hex
+    if redis_client is None:
+        sessions[session_id] = session
+        return
+    mapping = await asyncio.to_thread(encode_document, session)
+    decoded_documents[(session_id, session.doc_version)] = (session.doc_chunks, session.doc_index)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.delete(doc_key(session_id))
+        pipe.hset(doc_key(session_id), mapping=mapping)
+        pipe.expire(doc_key(session_id), SESSION_TTL_SECONDS)
+        pipe.expire(history_key(session_id), SESSION_TTL_SECONDS)
+        await pipe.execute()
+
+async def append_history(session_id: str, session: SessionData, *entries: dict) -> None:
+    """Append entries to the session history and refresh its expiry.
+
+    In Redis this is an RPUSH, so concurrent turns on the same session in different workers all keep
+    their messages.
+    """
+    session.history.extend(entries)
+    if redis_client is None:
+        sessions[session_id] = session
+        return
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.rpush(history_key(session_id), *[json.dumps(entry) for entry in entries])
+        pipe.expire(history_key(session_id), SESSION_TTL_SECONDS)
+        pipe.expire(doc_key(session_id), SESSION_TTL_SECONDS)
+        await pipe.execute()
+
+async def replace_history_head(session_id: str, old_head: List[dict], new_entry: dict) -> bool:
+    """Atomically replace the first len(old_head) history entries with new_entry.
+
+    Entries appended meanwhile are kept. Nothing changes (and False is returned) if the history no
+    longer starts with old_head, e.g. because another compaction got there first.
+    """
+    if redis_client is None:
+        # Single event loop and no await below, so check-and-splice cannot interleave with a chat turn
+        session = sessions.get(session_id)
+        if session is None or session.history[:len(old_head)] != old_head:
+            return False
+        session.history = [new_entry] + session.history[len(old_head):]
+        sessions[session_id] = session
+        return True
+    key = history_key(session_id)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        # WATCH aborts the transaction if the list changes between the check and EXEC; a concurrent
+        # RPUSH from a chat turn just means checking again
+        for _ in range(3):
+            try:
+                await pipe.watch(key)
+                head = await pipe.lrange(key, 0, len(old_head) - 1)
+                if [json.loads(entry) for entry in head] != old_head:
+                    return False
+                pipe.multi()
+                pipe.ltrim(key, len(old_head), -1)
+                pipe.lpush(key, json.dumps(new_entry))
+                pipe.expire(key, SESSION_TTL_SECONDS)
+                await pipe.execute()
+                return True
+            except WatchError:
+                continue
+    return False
+
+async def get_or_create_session(session_id: Optional[str]) -> tuple[str, SessionData]:
+    """Load the requested session, starting a fresh one if it is missing."""
+    session = await load_session(session_id)
+    if session is None:
+        session_id = str(uuid.uuid4())
+        session = SessionData(history=[])
+    return session_id, session
+
+# Rolling history window: past HISTORY_MAX_MESSAGES entries, everything except the newest
+# HISTORY_KEEP_MESSAGES is folded into a single summary note
+HISTORY_MAX_MESSAGES = 20
+HISTORY_KEEP_MESSAGES = 10
+
+async def compact_history(session_id: str) -> None:
+    """Summarize older history entries so prompt size stays bounded; runs after the response is sent."""
+    session = await load_session(session_id)
+    if session is None or len(session.history) <= HISTORY_MAX_MESSAGES:
+        return
+    older = session.history[:-HISTORY_KEEP_MESSAGES]
+    transcript = "\n".join(f"{m.get('role', 'user')}: {m['content']}" for m in older)
+    try:
+        response = await SUMMARIZE_LLM.ainvoke([
+            SystemMessage(content="Summarize this conversation concisely, keeping any facts the user may refer back to."),
+            HumanMessage(content=transcript),
+        ])
+    except Exception as e:
+        print(f"Warning: history compaction failed: {e}")
+        return
+
+    # Splice only if the summarized entries are still at the head; messages added meanwhile are kept
+    note = {"role": "system", "content": "Earlier conversation summary: " + response.content.strip()}
+    await replace_history_head(session_id, older, note)
 
 # Persona settings
 PERSONA_SETTINGS = {
@@ -65,6 +492,10 @@ PERSONA_SETTINGS = {
     "friendly": 0.5
 }
 
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Event; the payload is JSON so newlines in tokens are safe."""
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
 class AskRequest(BaseModel):
     question: str
     research: bool = False
@@ -73,164 +504,194 @@ class PersonalityRequest(BaseModel):
     personality: str
 
 @app.post("/set_personality")
-def set_personality(req: PersonalityRequest):
-    global sessions
+async def set_personality(req: PersonalityRequest):
     session_id = str(uuid.uuid4())
-    sessions[session_id] = SessionData(history=[SystemMessage(content=f"You are a {req.personality} assistant.").dict()])
-    return {"status": "ok", "session_id": session_id, "personality": req.personality.lower()}
+    await append_history(session_id, SessionData(), SystemMessage(content=f"You are a {req.personality} assistant.").dict())
+    return ORJSONResponse(content={"status": "ok", "session_id": session_id, "personality": req.personality.lower()})
 
 @app.post("/upload")
 async def upload_document(file: UploadFile = File(...), session_id: Optional[str] = None):
-    global sessions
-    if not session_id or session_id == "undefined" or session_id not in sessions:
-        session_id = str(uuid.uuid4())
-        sessions[session_id] = SessionData(history=[])
-    session = sessions[session_id]
+    session_id, session = await get_or_create_session(session_id)
 
     filename = file.filename or "document"
     ext = os.path.splitext(filename)[1].lower()
     if ext not in [".pdf", ".docx", ".doc"]:
         raise HTTPException(status_code=400, detail="Unsupported file type. Only PDF, DOCX, or DOC files are allowed.")
 
-    try:
-        content_bytes = await file.read()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to read file: {e}")
+    # Spool the upload to disk in bounded chunks instead of holding the whole file in memory. The
+    # file is closed before extraction (Windows cannot reopen an open temp file), and the temp
+    # directory is removed when the block exits, whichever path leaves it
+    digest = hashlib.blake2b(digest_size=16)
+    async with aiofiles.tempfile.TemporaryDirectory(dir=UPLOAD_TMP_DIR) as tmp_dir:
+        tmp_path = os.path.join(tmp_dir, f"upload{ext}")
+        try:
+            async with aiofiles.open(tmp_path, "wb") as tmp:
+                while chunk := await file.read(UPLOAD_READ_CHUNK_SIZE):
+                    await tmp.write(chunk)
+                    digest.update(chunk)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to read file: {e}")
 
-    text_content = ""
-    try:
-        if ext == ".pdf":
-            import fitz  # PyMuPDF
-            pdf = fitz.open(stream=content_bytes, filetype="pdf")
-            for page in pdf:
-                text_content += page.get_text()
-        elif ext == ".docx":
-            from docx import Document
-            import io
-            doc = Document(io.BytesIO(content_bytes))
-            for para in doc.paragraphs:
-                text_content += para.text + "\n"
-        elif ext == ".doc":
-            import tempfile
-            with tempfile.NamedTemporaryFile(delete=False) as tmp:
-                tmp.write(content_bytes)
-                tmp_path = tmp.name
-            try:
-                result = subprocess.run(["antiword", tmp_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-                text_content = result.stdout.decode('utf-8', errors='ignore')
-            except subprocess.CalledProcessError:
-                raise HTTPException(status_code=500, detail="Failed to extract text from .doc file. Ensure antiword is installed.")
-            finally:
-                os.unlink(tmp_path)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error extracting text: {e}")
+        # Re-uploads of an identical file reuse the stored summary, chunks and index
+        cache_key = f"upload:{AZURE_DEPLOYMENT}:{EMBED_DEPLOYMENT}:{digest.hexdigest()}"
+        cached = await asyncio.to_thread(document_cache.get, cache_key)
+        if cached is not None:
+            session.doc_summary = cached["summary"]
+            session.doc_chunks = cached["chunks"]
+            session.doc_index = deserialize_index(cached["index"])
+            await save_document(session_id, session)
+            await append_history(session_id, session, {"role": "assistant", "content": session.doc_summary})
+            return ORJSONResponse(content={"session_id": session_id, "summary": session.doc_summary})
+
+        text_content = ""
+        try:
+            if ext == ".pdf":
+                import fitz  # PyMuPDF
+                with fitz.open(tmp_path) as pdf:
+                    text_content = "".join(page.get_text() for page in pdf)
+            elif ext == ".docx":
+                from docx import Document
+                doc = Document(tmp_path)
+                text_content = "\n".join(para.text for para in doc.paragraphs)
+            elif ext == ".doc":
+                proc = await asyncio.create_subprocess_exec(
+                    "antiword", tmp_path, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+                )
+                stdout, _ = await proc.communicate()
+                if proc.returncode != 0:
+                    raise HTTPException(status_code=500, detail="Failed to extract text from .doc file. Ensure antiword is installed.")
+                text_content = stdout.decode('utf-8', errors='ignore')
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error extracting text: {e}")
 
     if not text_content.strip():
         raise HTTPException(status_code=400, detail="Document text is empty or could not be extracted.")
 
     try:
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        chunks = splitter.split_text(text_content)
+        chunks = await split_document(text_content)
         docs = [LangchainDocument(page_content=chunk) for chunk in chunks]
-        summarize_llm = AzureChatOpenAI(
-            azure_deployment=AZURE_DEPLOYMENT,
-            openai_api_key=OPENAI_API_KEY,
-            openai_api_type="azure",
-            openai_api_version=AZURE_API_VERSION,
-            azure_endpoint=AZURE_ENDPOINT,
-            temperature=0.0,
-            max_tokens=500,
-            verbose=False,
-        )
-        summarize_chain = load_summarize_chain(summarize_llm, chain_type="map_reduce")
-        summary_text = summarize_chain.run(docs)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Summarization failed: {e}")
 
+    # Summarization and embedding are independent, so run both round trips concurrently
+    summary_result, vectors_result = await asyncio.gather(
+        summarize_documents(docs),
+        embed_chunks(chunks),
+        return_exceptions=True,
+    )
+    if isinstance(summary_result, Exception):
+        raise HTTPException(status_code=500, detail=f"Summarization failed: {summary_result}")
+    summary_text = summary_result
+
     session.doc_summary = summary_text
     try:
+        if isinstance(vectors_result, Exception):
+            raise vectors_result
+        session.doc_index = build_index(vectors_result)
         session.doc_chunks = chunks
-        session.doc_vectors = embedding_model.embed_documents(chunks)
     except Exception as e:
-        session.doc_vectors = None
+        session.doc_index = None
         session.doc_chunks = None
         print(f"Warning: document embeddings failed: {e}")
 
-    session.history.append({"role": "assistant", "content": summary_text})
-    return {"session_id": session_id, "summary": summary_text}
+    # Only fully processed documents are cached, so a failed embedding is retried on re-upload
+    if session.doc_index is not None:
+        try:
+            await asyncio.to_thread(
+                document_cache.set,
+                cache_key,
+                {"summary": summary_text, "chunks": chunks, "index": serialize_index(session.doc_index)},
+            )
+        except Exception as e:
+            print(f"Warning: failed to cache document: {e}")
+
+    await save_document(session_id, session)
+    await append_history(session_id, session, {"role": "assistant", "content": summary_text})
+    return ORJSONResponse(content={"session_id": session_id, "summary": summary_text})
 
 @app.post("/chat")
 async def chat(
+    background_tasks: BackgroundTasks,
     question: str = Body(..., embed=True),
     session_id: Optional[str] = Body(None, embed=True),
     personality: Optional[str] = Body("factual", embed=True),
     research: Optional[bool] = Body(False, embed=True)
 ):
-    global sessions
-    if not session_id or session_id == "undefined" or session_id not in sessions:
-        session_id = str(uuid.uuid4())
-        sessions[session_id] = SessionData(history=[])
-    session = sessions[session_id]
+    session_id, session = await get_or_create_session(session_id)
     temperature = PERSONA_SETTINGS.get(personality.lower(), 0.3)
     
-    # Build context from document summary if available
-    doc_context = session.doc_summary if session.doc_summary else ""
-    
-    # Perform web research only if requested
-    web_context = ""
-    if research and SERPAPI_API_KEY:
+    chat_model = CHAT_LLM.bind(temperature=temperature)
+
+    async def gather_context() -> List[str]:
+        """Retrieve document chunks and (if requested) web results concurrently; both are best-effort."""
+        async def doc_context() -> str:
+            # Without an index the summary is already part of the system prompt prefix
+            if session.doc_index is None or not session.doc_chunks:
+                return ""
+            try:
+                retrieved = await retrieve_chunks(session, question)
+            except Exception as e:
+                print(f"Warning: document retrieval failed: {e}")
+                retrieved = []
+            # Fall back to the summary when retrieval fails or finds nothing
+            return "\n\n".join(retrieved) or session.doc_summary or ""
+
+        async def web_context() -> str:
+            if not (research and SERPAPI_API_KEY):
+                return ""
+            try:
+                search_result = await web_search(question)
+            except Exception as e:
+                print(f"Warning: web research failed: {e}")
+                return ""
+            if "I don't know" in search_result or "No good search result" in search_result:
+                return ""
+            return search_result
+
+        doc_text, web_text = await asyncio.gather(doc_context(), web_context())
+        sections = []
+        if doc_text:
+            sections.append(f"Relevant document information:\n{doc_text}")
+        if web_text:
+            sections.append(f"Web research information:\n{web_text}")
+        return sections
+
+    # The session id goes out before any round trip so the first byte is not held up by retrieval or
+    # web search; tokens follow as "token" events and the full answer is saved once the stream ends
+    async def event_generator():
+        yield sse_event("session", {"session_id": session_id})
+        context_sections = await gather_context()
+
+        # The cached prefix and history come first so consecutive turns share an identical prompt
+        # prefix (which Azure can cache); per-question context goes just before the question
+        converted_messages = [SystemMessage(content=build_system_prompt_prefix(session))]
+        for m in session.history:
+            converted_messages.append(MESSAGE_TYPES.get(m["role"], HumanMessage)(content=m["content"]))
+        if context_sections:
+            converted_messages.append(SystemMessage(content="\n".join(context_sections)))
+        converted_messages.append(HumanMessage(content=question))
+
+        parts = []
         try:
-            serp = SerpAPIWrapper(serpapi_api_key=SERPAPI_API_KEY, params={"engine": "bing", "gl": "us", "hl": "en"})
-            search_result = serp.run(question)
+            async for chunk in chat_model.astream(converted_messages):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield sse_event("token", {"content": chunk.content})
         except Exception as e:
-            search_result = ""
-        if search_result and "I don't know" not in search_result and "No good search result" not in search_result:
-            web_context = search_result
-
-    # Build system prompt with context
-    system_prompt = "You are an AI assistant."
-    if doc_context:
-        system_prompt += f"\nRelevant document information:\n{doc_context}"
-    if web_context:
-        system_prompt += f"\nWeb research information:\n{web_context}"
-    
-    # Build messages as dictionaries
-    messages_dict = [{"role": "system", "content": system_prompt}]
-    for msg in session.history:
-        messages_dict.append(msg)
-    messages_dict.append({"role": "user", "content": question})
-    
-    # Convert messages_dict to proper BaseMessage objects
-    converted_messages = []
-    for m in messages_dict:
-        if m["role"] == "system":
-            converted_messages.append(SystemMessage(content=m["content"]))
-        elif m["role"] == "user":
-            converted_messages.append(HumanMessage(content=m["content"]))
-        elif m["role"] == "assistant":
-            converted_messages.append(AIMessage(content=m["content"]))
-        else:
-            converted_messages.append(HumanMessage(content=m["content"]))
-    
-    try:
-        chat_model = AzureChatOpenAI(
-            azure_deployment=AZURE_DEPLOYMENT,
-            openai_api_key=OPENAI_API_KEY,
-            openai_api_type="azure",
-            openai_api_version=AZURE_API_VERSION,
-            azure_endpoint=AZURE_ENDPOINT,
-            temperature=temperature,
-            verbose=False,
+            yield sse_event("error", {"detail": f"LLM error: {e}"})
+            return
+        answer = "".join(parts).strip()
+
+        await append_history(
+            session_id, session, {"role": "user", "content": question}, {"role": "assistant", "content": answer}
         )
-        assistant_response = chat_model(converted_messages)
-        answer = assistant_response.content.strip()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"LLM error: {e}")
-    
-    session.history.append({"role": "user", "content": question})
-    session.history.append({"role": "assistant", "content": answer})
-    return {"session_id": session_id, "answer": answer}
+        if len(session.history) > HISTORY_MAX_MESSAGES:
+            background_tasks.add_task(compact_history, session_id)
+        yield sse_event("done", {"session_id": session_id, "answer": answer})
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 if __name__ == "__main__":
+    # Development server; for multiple workers use gunicorn -c gunicorn.conf.py main:app
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,12 @@
+from uvicorn.workers import UvicornWorker
+
+
+class BoundedUvicornWorker(UvicornWorker):
+    """UvicornWorker that enforces gunicorn's worker_connections as uvicorn's limit_concurrency.
+
+    The stock worker ignores worker_connections; with this, requests beyond the limit get a 503.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.config.limit_concurrency = self.cfg.worker_connections
@@ -1,6 +1,7 @@
 import React, { useState, useRef, useEffect } from 'react';
 import { PaperAirplaneIcon, UserIcon } from '@heroicons/react/24/solid';
 import { MagnifyingGlassIcon, PaperClipIcon, BoltIcon } from '@heroicons/react/24/outline';
+import { readChatStream } from '../lib/streamChat';
 
 interface ChatWindowProps {
   sessionId: string;
@@ -32,6 +33,13 @@ const ChatWindow: React.FC<ChatWindowProps> = ({ sessionId, personality, summary
     setMessages(prev => [...prev, { sender: 'user', content: question }]);
     setIsLoading(true);
     let placeholderIndex: number | null = null;
+    const setAssistantMessage = (index: number, content: string) => {
+      setMessages(prev => {
+        const newMsgs = [...prev];
+        newMsgs[index] = { sender: 'assistant', content };
+        return newMsgs;
+      });
+    };
     if (useResearch) {
       placeholderIndex = messages.length + 1;
       setMessages(prev => [
@@ -54,14 +62,20 @@ const ChatWindow: React.FC<ChatWindowProps> = ({ sessionId, personality, summary
         const errorText = await response.text();
         throw new Error(`HTTP error! status: ${response.status} - ${errorText}`);
       }
-      const data = await response.json();
+      // Show the answer as it streams in, reusing the research placeholder if there is one
+      let streamed = '';
+      const data = await readChatStream(response, (token) => {
+        streamed += token;
+        if (placeholderIndex === null) {
+          placeholderIndex = messages.length + 1;
+          setMessages(prev => [...prev, { sender: 'assistant', content: streamed }]);
+        } else {
+          setAssistantMessage(placeholderIndex, streamed);
+        }
+      });
       const answer = data.answer || "*(No answer)*";
-      if (useResearch && placeholderIndex !== null) {
-        setMessages(prev => {
-          const newMsgs = [...prev];
-          newMsgs[placeholderIndex] = { sender: 'assistant', content: answer };
-          return newMsgs;
-        });
+      if (placeholderIndex !== null) {
+        setAssistantMessage(placeholderIndex, answer);
       } else {
         setMessages(prev => [...prev, { sender: 'assistant', content: answer }]);
       }
@@ -71,12 +85,8 @@ const ChatWindow: React.FC<ChatWindowProps> = ({ sessionId, personality, summary
     } catch (error: any) {
       console.error("Error fetching answer:", error);
       const errMsg = "Error: Failed to get answer.";
-      if (useResearch && placeholderIndex !== null) {
-        setMessages(prev => {
-          const newMsgs = [...prev];
-          newMsgs[placeholderIndex] = { sender: 'assistant', content: errMsg };
-          return newMsgs;
-        });
+      if (placeholderIndex !== null) {
+        setAssistantMessage(placeholderIndex, errMsg);
       } else {
         setMessages(prev => [
           ...prev,
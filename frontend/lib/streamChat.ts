@@ -0,0 +1,58 @@
+export type ChatResult = {
+  session_id: string;
+  answer: string;
+  tools_used?: string[];
+};
+
+// Reads the Server-Sent Events stream returned by /chat, calling onToken for each
+// streamed piece of the answer and resolving with the final "done" payload.
+export async function readChatStream(
+  response: Response,
+  onToken: (token: string) => void
+): Promise<ChatResult> {
+  if (!response.body) {
+    throw new Error("Chat response has no body");
+  }
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let result: ChatResult | null = null;
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary = buffer.indexOf("\n\n");
+    while (boundary !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf("\n\n");
+
+      let event = "message";
+      const dataLines: string[] = [];
+      for (const line of rawEvent.split("\n")) {
+        if (line.startsWith("event:")) {
+          event = line.slice(6).trim();
+        } else if (line.startsWith("data:")) {
+          dataLines.push(line.slice(5).trim());
+        }
+      }
+      if (dataLines.length === 0) continue;
+
+      const data = JSON.parse(dataLines.join("\n"));
+      if (event === "token") {
+        onToken(data.content);
+      } else if (event === "done") {
+        result = data;
+      } else if (event === "error") {
+        throw new Error(data.detail);
+      }
+    }
+  }
+
+  if (!result) {
+    throw new Error("Chat stream ended before the answer was complete");
+  }
+  return result;
+}
@@ -8,6 +8,7 @@ import {
   PaperClipIcon,
   BoltIcon,
 } from "@heroicons/react/24/outline";
+import { readChatStream } from "../lib/streamChat";
 
 type Message = {
   sender: "user" | "assistant";
@@ -103,6 +104,13 @@ export default function Chat() {
     setIsTyping(true);
 
     let placeholderIndex: number | null = null;
+    const setAssistantMessage = (index: number, content: string) => {
+      setMessages((prev) => {
+        const newMsgs = [...prev];
+        newMsgs[index] = { sender: "assistant", content };
+        return newMsgs;
+      });
+    };
     if (useResearch) {
       placeholderIndex = messages.length + 1;
       setMessages((prev) => [
@@ -130,15 +138,24 @@ export default function Chat() {
         const errorText = await response.text();
         throw new Error(`HTTP error! status: ${response.status} - ${errorText}`);
       }
-      const data = await response.json();
+      // Show the answer as it streams in, reusing the research placeholder if there is one
+      let streamed = "";
+      const data = await readChatStream(response, (token) => {
+        streamed += token;
+        if (placeholderIndex === null) {
+          placeholderIndex = messages.length + 1;
+          setMessages((prev) => [
+            ...prev,
+            { sender: "assistant", content: streamed },
+          ]);
+        } else {
+          setAssistantMessage(placeholderIndex, streamed);
+        }
+      });
       const answer = data.answer || "*(No answer)*";
 
-      if (useResearch && placeholderIndex !== null) {
-        setMessages((prev) => {
-          const newMsgs = [...prev];
-          newMsgs[placeholderIndex] = { sender: "assistant", content: answer };
-          return newMsgs;
-        });
+      if (placeholderIndex !== null) {
+        setAssistantMessage(placeholderIndex, answer);
       } else {
         setMessages((prev) => [
           ...prev,
@@ -148,12 +165,8 @@ export default function Chat() {
     } catch (error) {
       console.error("Error fetching answer:", error);
       const errMsg = "Error: Failed to get answer.";
-      if (useResearch && placeholderIndex !== null) {
-        setMessages((prev) => {
-          const newMsgs = [...prev];
-          newMsgs[placeholderIndex] = { sender: "assistant", content: errMsg };
-          return newMsgs;
-        });
+      if (placeholderIndex !== null) {
+        setAssistantMessage(placeholderIndex, errMsg);
       } else {
         setMessages((prev) => [
           ...prev,